@@ -0,0 +1,63 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial, wraps
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import re_path
+
+from foodgram.timing import render_response
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.ASYNC_ORM_WORKERS,
+        thread_name_prefix='orm',
+    )
+
+
+def call_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            render_response(response)
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            get_executor(),
+            context.run,
+            partial(call_view, view, request, *args, **kwargs),
+        )
+
+    return wrapper
+
+
+def async_urls(urls, names):
+    if not settings.ASYNC_VIEWS:
+        return urls
+    return [
+        (
+            re_path(
+                str(url.pattern),
+                async_view(url.callback),
+                url.default_args,
+                url.name,
+            )
+            if url.name in names
+            else url
+        )
+        for url in urls
+    ]
@@ -0,0 +1,37 @@
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.cache import get_cached_token, set_cached_token
+from foodgram.replicas import read_from_primary, using_replica
+from users.models import User
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cached = get_cached_token(key)
+        if cached is None:
+            try:
+                user, token = super().authenticate_credentials(key)
+            except AuthenticationFailed:
+                if not using_replica():
+                    raise
+                with read_from_primary():
+                    user, token = super().authenticate_credentials(key)
+            set_cached_token(token)
+            return user, token
+        if not cached['is_active']:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        user = User.from_db(
+            router.db_for_read(User),
+            ('id', 'is_active'),
+            (cached['user_id'], cached['is_active']),
+        )
+        token = self.get_model().from_db(
+            router.db_for_read(self.get_model()),
+            ('key', 'user_id'),
+            (key, user.id),
+        )
+        token.user = user
+        return user, token
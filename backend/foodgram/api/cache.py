@@ -0,0 +1,68 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'recipes:generation'
+TOKEN_KEY = 'auth:token:{}'
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        return cache.get(GENERATION_KEY)
+    return generation
+
+
+def recipe_cache_key(recipe, generation):
+    return f'recipe:{generation}:{recipe.id}:{recipe.updated_at.isoformat()}'
+
+
+def get_cached_recipes(recipes):
+    generation = get_generation()
+    keys = {
+        recipe_cache_key(recipe, generation): recipe.id for recipe in recipes
+    }
+    cached = cache.get_many(keys)
+    return {keys[key]: data for key, data in cached.items()}
+
+
+def set_cached_recipes(recipes, recipes_data):
+    generation = get_generation()
+    cache.set_many(
+        {
+            recipe_cache_key(recipe, generation): recipes_data[recipe.id]
+            for recipe in recipes
+        },
+        timeout=settings.RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_all_recipes():
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def token_cache_key(key):
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def get_cached_token(key):
+    if not settings.SHARED_CACHE:
+        return None
+    return cache.get(token_cache_key(key))
+
+
+def set_cached_token(token):
+    if not settings.SHARED_CACHE:
+        return
+    cache.set(
+        token_cache_key(token.key),
+        {'user_id': token.user_id, 'is_active': token.user.is_active},
+        timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_tokens(keys):
+    cache.delete_many([token_cache_key(key) for key in keys])
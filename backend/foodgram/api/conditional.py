@@ -0,0 +1,53 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from users.serializers import get_subscriptions
+
+
+def get_recipes_etag(request, recipes, *extra):
+    user = request.user
+    subscriptions = get_subscriptions(request) if user.is_authenticated else ()
+    parts = [request.get_host(), user.id, *extra]
+    parts.extend(
+        (
+            recipe.id,
+            recipe.updated_at.isoformat(),
+            getattr(recipe, 'is_favorited', False),
+            getattr(recipe, 'is_in_shopping_cart', False),
+            recipe.author_id in subscriptions,
+        )
+        for recipe in recipes
+    )
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def get_last_modified(recipes):
+    return max(
+        (recipe.updated_at for recipe in recipes),
+        default=None,
+    )
+
+
+def get_not_modified_response(request, etag, last_modified, check_modified):
+    timestamp = None
+    if check_modified and last_modified is not None:
+        timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=timestamp,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_vary_headers(response, ('Authorization',))
+    return response
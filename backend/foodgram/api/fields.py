@@ -1,4 +1,5 @@
 import webcolors
+from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 
@@ -13,3 +14,10 @@ class Hex2NameColor(serializers.Field):
         except ValueError:
             raise serializers.ValidationError('Такого цвета нет')
         return data
+
+
+class Base64OrFileImageField(Base64ImageField):
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            return super().to_internal_value(data)
+        return serializers.ImageField.to_internal_value(self, data)
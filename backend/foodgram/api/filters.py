@@ -1,6 +1,8 @@
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -8,26 +10,37 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
-        conjoined=False,
+        method='tags_filter',
     )
     is_favorited = filters.BooleanFilter(method='favorite_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='shopping_cart_filter',
     )
+    search = filters.CharFilter(method='search_filter')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
 
+    def tags_filter(self, queryset, name, tags):
+        if not tags:
+            return queryset
+        if any(tag.mask is None for tag in tags):
+            return queryset.filter(tags__in=tags).distinct()
+        return queryset.with_any_tag(sum(tag.mask for tag in tags))
+
     def favorite_filter(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
-        return False
+        if not value:
+            return queryset
+        return queryset.filter_user_flag(Favorite, self.request.user)
 
     def shopping_cart_filter(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        return False
+        if not value:
+            return queryset
+        return queryset.filter_user_flag(ShoppingCart, self.request.user)
+
+    def search_filter(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
 
 class IngredientFilter(FilterSet):
@@ -36,3 +49,11 @@ class IngredientFilter(FilterSet):
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and all(field.lstrip('-') != 'id' for field in ordering):
+            return [*ordering, '-id']
+        return ordering
@@ -0,0 +1,79 @@
+import bisect
+import threading
+import time
+from operator import itemgetter
+
+from django.core.cache import cache
+
+from recipes.models import Ingredient
+
+VERSION_KEY = 'ingredients:version'
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        return cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_index():
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = ([], [])
+
+    def build(self, version):
+        rows = Ingredient.objects.values_list(
+            'id',
+            'name',
+            'measurement_unit',
+        ).order_by()
+        ingredients = sorted(
+            (
+                (
+                    name.casefold(),
+                    {'id': pk, 'name': name, 'measurement_unit': unit},
+                )
+                for pk, name, unit in rows
+            ),
+            key=itemgetter(0),
+        )
+        self.entries = (
+            [key for key, _ in ingredients],
+            [item for _, item in ingredients],
+        )
+        self.version = version
+
+    def refresh(self):
+        version = get_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build(version)
+
+    def search(self, query='', limit=None):
+        self.refresh()
+        keys, items = self.entries
+        query = query.casefold()
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_left(keys, query + '\U0010ffff', lo=start)
+        found = items[start:end]
+        if limit is not None and len(found) >= limit:
+            return found[:limit]
+        if query:
+            found.extend(
+                item
+                for key, item in zip(keys, items)
+                if query in key and not key.startswith(query)
+            )
+        return found if limit is None else found[:limit]
+
+
+ingredient_index = IngredientIndex()
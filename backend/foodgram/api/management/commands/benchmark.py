@@ -0,0 +1,273 @@
+import json
+import math
+import random
+import resource
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+
+PERCENTILES = (50, 95, 99)
+
+
+def recipes_list(rng, data):
+    return f'/api/recipes/?page={rng.randint(1, 5)}'
+
+
+def recipes_by_tags(rng, data):
+    tags = rng.sample(data['tags'], min(len(data['tags']), 2))
+    return '/api/recipes/?' + urlencode([('tags', tag) for tag in tags])
+
+
+def recipes_popular(rng, data):
+    return '/api/recipes/?ordering=-favorites_count'
+
+
+def recipes_search(rng, data):
+    return '/api/recipes/?' + urlencode({'search': rng.choice(data['words'])})
+
+
+def recipes_favorited(rng, data):
+    return '/api/recipes/?is_favorited=1'
+
+
+def recipe_detail(rng, data):
+    return f'/api/recipes/{rng.choice(data["recipes"])}/'
+
+
+def subscriptions(rng, data):
+    return '/api/users/subscriptions/?recipes_limit=3'
+
+
+def ingredients(rng, data):
+    length = rng.randint(1, 4)
+    name = rng.choice(data['ingredients'])[:length]
+    return '/api/ingredients/?' + urlencode({'name': name})
+
+
+def download_shopping_cart(rng, data):
+    return '/api/recipes/download_shopping_cart/'
+
+
+SCENARIOS = (
+    (recipes_list, 20, False),
+    (recipes_by_tags, 10, False),
+    (recipes_popular, 5, False),
+    (recipes_search, 5, False),
+    (recipes_favorited, 5, True),
+    (recipe_detail, 20, False),
+    (subscriptions, 8, True),
+    (ingredients, 20, False),
+    (download_shopping_cart, 7, True),
+)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет типичную смесь запросов к API и сохраняет '
+        'перцентили задержек, число запросов к БД и память в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Сколько пользователей использовать для запросов.',
+        )
+        parser.add_argument(
+            '--anonymous',
+            type=float,
+            default=0.3,
+            help='Доля анонимных запросов к публичным эндпоинтам.',
+        )
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help='Измерять пик выделенной памяти на запрос (медленнее).',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            type=Path,
+            help='Файл с результатами (по умолчанию benchmark-<время>.json).',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один запрос.')
+        rng = random.Random(options['seed'])
+        data = self.get_data(options['users'])
+        clients = [Client()] + [
+            Client(HTTP_AUTHORIZATION=f'Token {key}') for key in data['tokens']
+        ]
+        weights = [weight for _, weight, _ in SCENARIOS]
+        samples = defaultdict(list)
+        if options['trace_memory']:
+            tracemalloc.start()
+        started = time.monotonic()
+        for number in range(options['warmup'] + options['requests']):
+            scenario, _, auth_required = rng.choices(SCENARIOS, weights)[0]
+            client = clients[0]
+            if auth_required or rng.random() >= options['anonymous']:
+                client = rng.choice(clients[1:])
+            sample = self.run_request(
+                client,
+                scenario(rng, data),
+                options['trace_memory'],
+            )
+            if number >= options['warmup']:
+                samples[scenario.__name__].append(sample)
+        duration = time.monotonic() - started
+        if options['trace_memory']:
+            tracemalloc.stop()
+        results = {
+            'started_at': datetime.now().astimezone().isoformat(),
+            'duration_s': round(duration, 3),
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'seed': options['seed'],
+            'database': connections['default'].vendor,
+            'dataset': data['counts'],
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'scenarios': {
+                name: self.summarize(scenario_samples)
+                for name, scenario_samples in sorted(samples.items())
+            },
+            'overall': self.summarize(
+                [sample for values in samples.values() for sample in values],
+            ),
+        }
+        self.print_results(results)
+        output = options['output'] or Path(
+            f'benchmark-{datetime.now():%Y%m%d-%H%M%S}.json',
+        )
+        output.write_text(
+            json.dumps(results, ensure_ascii=False, indent=2),
+            encoding='utf-8',
+        )
+        message = f'Результаты записаны в {output}'
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def get_data(self, users):
+        user_ids = list(
+            User.objects.filter(
+                is_active=True,
+                shopping_cart__isnull=False,
+            )
+            .distinct()
+            .order_by('-id')
+            .values_list('id', flat=True)[:users],
+        )
+        if not user_ids:
+            raise CommandError(
+                'Нет пользователей с корзиной: сначала выполните seed_data.',
+            )
+        names = list(
+            Ingredient.objects.values_list('name', flat=True)[:2000],
+        )
+        recipe_ids = Recipe.objects.values_list('id', flat=True)
+        recipes = list(recipe_ids.order_by('-id')[:10000])
+        if not names or not recipes:
+            raise CommandError('Нет рецептов или ингредиентов для запросов.')
+        return {
+            'tokens': [
+                Token.objects.get_or_create(user_id=user_id)[0].key
+                for user_id in user_ids
+            ],
+            'tags': list(Tag.objects.values_list('slug', flat=True)),
+            'recipes': recipes,
+            'ingredients': names,
+            'words': sorted({name.split()[0] for name in names}),
+            'counts': {
+                model._meta.model_name: model.objects.count()
+                for model in (User, Recipe, Favorite, ShoppingCart, Follow)
+            },
+        }
+
+    @staticmethod
+    def run_request(client, url, trace_memory):
+        counter = QueryCounter()
+        if trace_memory:
+            tracemalloc.clear_traces()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return {
+            'ms': elapsed * 1000,
+            'queries': counter.count,
+            'error': response.status_code >= 400,
+            'memory_kb': (
+                tracemalloc.get_traced_memory()[1] / 1024
+                if trace_memory
+                else None
+            ),
+        }
+
+    @staticmethod
+    def summarize(samples):
+        latencies = [sample['ms'] for sample in samples]
+        queries = [sample['queries'] for sample in samples]
+        summary = {
+            'count': len(samples),
+            'errors': sum(sample['error'] for sample in samples),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            **{
+                f'p{percent}_ms': round(percentile(latencies, percent), 2)
+                for percent in PERCENTILES
+            },
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+        }
+        memory = [sample['memory_kb'] for sample in samples]
+        if memory[0] is not None:
+            summary['peak_memory_kb'] = round(max(memory), 1)
+        return summary
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"сценарий":<24}{"n":>6}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросы":>9}{"ошибки":>8}',
+        )
+        rows = {**results['scenarios'], 'overall': results['overall']}
+        for name, summary in rows.items():
+            self.stdout.write(
+                f'{name:<24}{summary["count"]:>6}'
+                f'{summary["p50_ms"]:>9.1f}{summary["p95_ms"]:>9.1f}'
+                f'{summary["p99_ms"]:>9.1f}{summary["queries_mean"]:>9.1f}'
+                f'{summary["errors"]:>8}',
+            )
+        self.stdout.write(f'Пик RSS: {results["max_rss_kb"]} КБ')
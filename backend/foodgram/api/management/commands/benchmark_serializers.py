@@ -0,0 +1,223 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import ORJSONRenderer
+from api.serializers import (
+    FollowSerializer,
+    MiniRecipeSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+from recipes.images import get_variant_urls
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+)
+from users.models import Follow
+from users.serializers import CustomUserSerializer
+
+
+class ReferenceRecipeIngredientsSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit',
+    )
+
+    class Meta:
+        model = RecipeIngredients
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class ReferenceRecipeSerializer(serializers.ModelSerializer):
+    tags = TagSerializer(many=True)
+    author = CustomUserSerializer()
+    ingredients = ReferenceRecipeIngredientsSerializer(
+        many=True,
+        source='recipe_ingredients',
+    )
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'image',
+            'image_variants',
+            'text',
+            'cooking_time',
+        )
+
+    def get_obj(self, obj, model):
+        user = self.context.get('request').user
+        if user.is_authenticated:
+            return model.objects.filter(user=user, recipe_id=obj.id).exists()
+        return False
+
+    def get_is_favorited(self, obj):
+        return self.get_obj(obj, Favorite)
+
+    def get_is_in_shopping_cart(self, obj):
+        return self.get_obj(obj, ShoppingCart)
+
+    def get_image_variants(self, obj):
+        variants = get_variant_urls(obj)
+        if variants is None:
+            return None
+        request = self.context.get('request')
+        return {
+            variant: {
+                extension: request.build_absolute_uri(url)
+                for extension, url in urls.items()
+            }
+            for variant, urls in variants.items()
+        }
+
+
+def serialize_recipe(serializer, recipe):
+    return serializer.add_viewer_fields(
+        serializer.to_shared_representation(recipe),
+        recipe,
+    )
+
+
+def serialize_reference_recipe(serializer, recipe):
+    return ReferenceRecipeSerializer(recipe, context=serializer.context).data
+
+
+def serialize_fields(serializer, instance):
+    return serializers.ModelSerializer.to_representation(serializer, instance)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает быстрые сериализаторы и orjson-рендерер со стандартными '
+        'полями DRF: проверяет побайтовое совпадение ответов и печатает время.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--follows', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('Нужен хотя бы один повтор.')
+        follow = Follow.objects.order_by('-id').first()
+        if follow is None:
+            raise CommandError('Нет подписок: сначала выполните seed_data.')
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = follow.user
+        recipes = self.get_recipes(request, options['recipes'])
+        follows = self.get_follows(follow.user, options['follows'])
+        if not recipes:
+            raise CommandError('Нет рецептов: сначала выполните seed_data.')
+        context = {'request': request}
+        cases = (
+            (
+                'recipe',
+                recipes,
+                RecipeSerializer(context=context),
+                serialize_reference_recipe,
+                serialize_recipe,
+            ),
+            (
+                'mini_recipe',
+                recipes,
+                MiniRecipeSerializer(context=context),
+                serialize_fields,
+                MiniRecipeSerializer.to_representation,
+            ),
+            (
+                'follow',
+                follows,
+                FollowSerializer(context=context),
+                serialize_fields,
+                FollowSerializer.to_representation,
+            ),
+        )
+        self.stdout.write(
+            f'{"сериализатор":<14}{"n":>6}{"DRF, мс":>10}'
+            f'{"быстрый, мс":>14}{"ускорение":>11}',
+        )
+        for name, instances, serializer, reference, fast in cases:
+            self.run_case(
+                name,
+                instances,
+                lambda: JSONRenderer().render(
+                    [reference(serializer, obj) for obj in instances],
+                ),
+                lambda: ORJSONRenderer().render(
+                    [fast(serializer, obj) for obj in instances],
+                ),
+                options['repeat'],
+            )
+
+    @staticmethod
+    def get_recipes(request, count):
+        recipes = list(
+            Recipe.objects.with_user_flags(request.user).order_by('-id')[
+                :count
+            ],
+        )
+        prefetch_related_objects(
+            recipes,
+            'tags',
+            'author',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient',
+                ),
+            ),
+        )
+        return recipes
+
+    @staticmethod
+    def get_follows(user, count):
+        return list(
+            user.follower.select_related('author')
+            .annotate(recipes_count=Count('author__recipes'))
+            .order_by('-id')
+            .prefetch_related(
+                Prefetch('author__recipes', to_attr='recipes_preview'),
+            )[:count],
+        )
+
+    def run_case(self, name, instances, reference, fast, repeat):
+        expected = reference()
+        if fast() != expected:
+            raise CommandError(f'Ответы {name} различаются.')
+        reference_ms = self.measure(reference, repeat)
+        fast_ms = self.measure(fast, repeat)
+        self.stdout.write(
+            f'{name:<14}{len(instances):>6}{reference_ms:>10.2f}'
+            f'{fast_ms:>14.2f}{reference_ms / fast_ms:>10.1f}x',
+        )
+
+    @staticmethod
+    def measure(render, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
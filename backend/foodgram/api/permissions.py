@@ -2,6 +2,12 @@ from rest_framework import permissions
 
 
 class IsAdminOwnerOrReadOnly(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return (
+            request.method in permissions.SAFE_METHODS
+            or request.user.is_authenticated
+        )
+
     def has_object_permission(self, request, view, obj):
         del view
         return (
@@ -1,18 +1,42 @@
+import json
+
 from django.conf import settings
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
+from django.utils.datastructures import MultiValueDict
 from rest_framework import serializers
+from rest_framework.utils import html
 
-from api.fields import Hex2NameColor
+from api.cache import get_cached_recipes, set_cached_recipes
+from api.fields import Base64OrFileImageField, Hex2NameColor
+from foodgram.timing import measure_serialize
+from recipes.images import get_variant_urls
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
     RecipeIngredients,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
 )
 from users.models import Follow
-from users.serializers import CustomUserSerializer
+from users.serializers import CustomUserSerializer, get_subscriptions
+
+
+def get_recipes_limit(request):
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
+def get_author_representation(author):
+    return {
+        field: False if field == 'is_subscribed' else getattr(author, field)
+        for field in CustomUserSerializer.Meta.fields
+    }
 
 
 class MiniRecipeSerializer(serializers.ModelSerializer):
@@ -21,6 +45,30 @@ class MiniRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
+    @measure_serialize()
+    def to_representation(self, instance):
+        image = instance.image.url if instance.image else None
+        request = self.context.get('request')
+        if image is not None and request is not None:
+            image = request.build_absolute_uri(image)
+        return {
+            'id': instance.id,
+            'name': instance.name,
+            'image': image,
+            'cooking_time': instance.cooking_time,
+        }
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_BULK_RECIPES,
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
 
 class FollowSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='author.id')
@@ -52,25 +100,41 @@ class FollowSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Вы не можете подписаться на себя!',
             )
-        if user.following.filter(author_id=author_id).exists():
+        if user.follower.filter(author_id=author_id).exists():
             raise serializers.ValidationError(
                 'Вы уже подписаны на этого пользователя!',
             )
         return data
 
+    @measure_serialize()
+    def to_representation(self, instance):
+        author = instance.author
+        return {
+            'id': author.id,
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': self.get_is_subscribed(instance),
+            'recipes': self.get_recipes(instance),
+            'recipes_count': self.get_recipes_count(instance),
+        }
+
     def get_is_subscribed(self, obj):
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.author.following.filter(user=user).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if obj.user_id == user.id:
+            return True
+        return obj.author.following.filter(user=user).exists()
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit',
-        )
-        recipes = obj.author.recipes.all()
-        if recipes_limit:
-            recipes = recipes[: int(recipes_limit)]
+        recipes = getattr(obj.author, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.author.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = MiniRecipeSerializer(
             recipes,
             many=True,
@@ -78,7 +142,10 @@ class FollowSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.all().count()
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is None:
+            return obj.author.recipes.all().count()
+        return recipes_count
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -95,19 +162,6 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class RecipeIngredientsSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField(source='ingredient.id')
-    name = serializers.ReadOnlyField(source='ingredient.name')
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit',
-    )
-
-    class Meta:
-        model = RecipeIngredients
-        fields = ('id', 'name', 'measurement_unit', 'amount')
-        read_only_fields = ('amount',)
-
-
 class RecipeWriteIngredients(serializers.ModelSerializer):
     id = serializers.IntegerField()
 
@@ -127,59 +181,117 @@ class RecipeWriteIngredients(serializers.ModelSerializer):
         return amount
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    tags = TagSerializer(many=True)
-    author = CustomUserSerializer()
-    ingredients = RecipeIngredientsSerializer(
-        many=True,
-        source='recipe_ingredients',
-    )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.to_representation_many(list(recipes))
 
+
+class RecipeSerializer(serializers.Serializer):
     class Meta:
-        model = Recipe
-        fields = (
-            'id',
-            'tags',
-            'author',
-            'ingredients',
-            'is_favorited',
-            'is_in_shopping_cart',
-            'name',
-            'image',
-            'text',
-            'cooking_time',
-        )
-        read_only_fields = (
-            'tags',
-            'author',
-            'is_favorited',
-            'is_in_shopping_cart',
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    @measure_serialize()
+    def to_representation_many(self, recipes):
+        shared = get_cached_recipes(recipes)
+        missing = [recipe for recipe in recipes if recipe.id not in shared]
+        if missing:
+            prefetch_related_objects(
+                missing,
+                'tags',
+                'author',
+                Prefetch(
+                    'recipe_ingredients',
+                    queryset=RecipeIngredients.objects.select_related(
+                        'ingredient',
+                    ),
+                ),
+            )
+            fresh = {
+                recipe.id: self.to_shared_representation(recipe)
+                for recipe in missing
+            }
+            set_cached_recipes(missing, fresh)
+            shared.update(fresh)
+        return [
+            self.add_viewer_fields(shared[recipe.id], recipe)
+            for recipe in recipes
+        ]
+
+    def to_shared_representation(self, instance):
+        return {
+            'id': instance.id,
+            'tags': [
+                {
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }
+                for tag in instance.tags.all()
+            ],
+            'author': get_author_representation(instance.author),
+            'ingredients': [
+                {
+                    'id': item.ingredient.id,
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in instance.recipe_ingredients.all()
+            ],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': instance.name,
+            'image': instance.image.url if instance.image else None,
+            'image_variants': get_variant_urls(instance),
+            'text': instance.text,
+            'cooking_time': instance.cooking_time,
+        }
+
+    def add_viewer_fields(self, data, instance):
+        request = self.context.get('request')
+        if data['image'] is not None:
+            data['image'] = request.build_absolute_uri(data['image'])
+        for urls in (data['image_variants'] or {}).values():
+            for extension, url in urls.items():
+                urls[extension] = request.build_absolute_uri(url)
+        data['author']['is_subscribed'] = (
+            request.user.is_authenticated
+            and instance.author_id in get_subscriptions(request)
         )
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
 
-    def get_obj(self, obj, model):
+    def get_obj(self, obj, model, annotation):
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return model.objects.filter(user=user, recipe_id=obj.id).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        annotated = getattr(obj, annotation, None)
+        if annotated is None:
+            annotated = model.objects.filter(
+                user=user,
+                recipe_id=obj.id,
+            ).exists()
+            setattr(obj, annotation, annotated)
+        return annotated
 
     def get_is_favorited(self, obj):
-        return self.get_obj(obj, Favorite)
+        return self.get_obj(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.get_obj(obj, ShoppingCart)
+        return self.get_obj(obj, ShoppingCart, 'is_in_shopping_cart')
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeWriteIngredients(many=True)
-    image = Base64ImageField()
+    image = Base64OrFileImageField()
 
     class Meta:
         model = Recipe
@@ -194,6 +306,35 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'cooking_time',
         )
 
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = self.parse_form_data(data)
+        return super().to_internal_value(data)
+
+    def parse_form_data(self, data):
+        parsed = data.dict()
+        for field in ('tags', 'ingredients'):
+            values = data.getlist(field)
+            if len(values) == 1 and values[0].lstrip().startswith('['):
+                try:
+                    parsed[field] = json.loads(values[0])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {field: 'Некорректный JSON.'},
+                    )
+            elif values:
+                parsed[field] = values
+        if 'ingredients' not in parsed:
+            parsed['ingredients'] = [
+                item.dict() if isinstance(item, MultiValueDict) else item
+                for item in html.parse_html_list(
+                    data,
+                    prefix='ingredients',
+                    default=[],
+                )
+            ]
+        return parsed
+
     def validate_cooking_time(self, cooking_time):
         if int(cooking_time) < settings.MIN_FIELD_RESTRICTION:
             raise serializers.ValidationError(
@@ -218,6 +359,17 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                     'Ингредиенты не должны повторяться.',
                 )
             ingredient_set.add(ingredient_id)
+        missing = (
+            ingredient_set
+            - Ingredient.objects.in_bulk(
+                ingredient_set,
+            ).keys()
+        )
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиентов с id '
+                f'{", ".join(map(str, sorted(missing)))} не существует.',
+            )
         return ingredients
 
     def validate_tags(self, tags):
@@ -225,6 +377,12 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Рецепт не может быть без тега!')
         if len(set(tags)) != len(tags):
             raise serializers.ValidationError('Теги не должны повторяться.')
+        missing = set(tags) - Tag.objects.in_bulk(tags).keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Тегов с id '
+                f'{", ".join(map(str, sorted(missing)))} не существует.',
+            )
         return tags
 
     def create_ingredients_for_recipe(self, ingredients, recipe):
@@ -238,6 +396,36 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredients.objects.bulk_create(recipe_ingredients)
 
+    def update_ingredients_for_recipe(self, ingredients, recipe):
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredients.objects.filter(recipe=recipe)
+        }
+        to_create, to_update, amounts = [], [], {}
+        for ingredient in ingredients:
+            item = current.pop(ingredient['id'], None)
+            if item is None:
+                to_create.append(ingredient)
+                amounts[ingredient['id']] = ingredient['amount']
+            elif item.amount != ingredient['amount']:
+                amounts[ingredient['id']] = ingredient['amount'] - item.amount
+                item.amount = ingredient['amount']
+                to_update.append(item)
+        for ingredient_id, item in current.items():
+            amounts[ingredient_id] = -item.amount
+        if current:
+            RecipeIngredients.objects.filter(
+                id__in=[item.id for item in current.values()],
+            ).delete()
+        RecipeIngredients.objects.bulk_update(to_update, ('amount',))
+        self.create_ingredients_for_recipe(to_create, recipe)
+        if amounts:
+            ShoppingListItem.objects.add_amounts(
+                list(recipe.shopping_cart.values_list('user_id', flat=True)),
+                amounts,
+            )
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -246,6 +434,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self.create_ingredients_for_recipe(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -258,8 +447,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         instance.image = validated_data.get('image', instance.image)
         instance.save()
-        RecipeIngredients.objects.filter(recipe=instance).delete()
-        self.create_ingredients_for_recipe(ingredients, instance)
+        self.update_ingredients_for_recipe(ingredients, instance)
         return instance
 
     def to_representation(self, instance):
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.cache import invalidate_all_recipes, invalidate_tokens
+from api.ingredient_index import invalidate_index
+from recipes.models import Ingredient, Tag
+from recipes.signals import catalog_changed
+from users.models import User
+
+
+def on_commit(function, *args):
+    transaction.on_commit(lambda: function(*args))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    on_commit(invalidate_all_recipes)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    on_commit(invalidate_index)
+
+
+@receiver(catalog_changed)
+def invalidate_catalog_caches(sender, **kwargs):
+    on_commit(invalidate_index)
+    on_commit(invalidate_all_recipes)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    on_commit(invalidate_tokens, list(keys))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    on_commit(invalidate_tokens, (instance.key,))
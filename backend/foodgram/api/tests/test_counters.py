@@ -0,0 +1,111 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.serializers import RecipeWriteSerializer
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+from users.models import User
+
+
+@override_settings(
+    IMAGE_VARIANT_WORKERS=0,
+    SERVER_TIMING=False,
+    REPLICA_DATABASES=[],
+)
+class RecipeCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user = (
+            User.objects.create_user(
+                email=f'{username}@example.com',
+                username=username,
+                first_name='Имя',
+                last_name='Фамилия',
+                password='counter-password',
+            )
+            for username in ('author', 'user')
+        )
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.ingredient = Ingredient.objects.create(
+            name='Ингредиент',
+            measurement_unit='г',
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Рецепт',
+            author=cls.author,
+            text='Описание',
+            cooking_time=10,
+            image='recipes/media/counter.png',
+        )
+        cls.recipe.tags.set((cls.tag,))
+        RecipeIngredients.objects.create(
+            recipe=cls.recipe,
+            ingredient=cls.ingredient,
+            amount=5,
+        )
+
+    def get_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_edit_keeps_concurrent_favorite(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        response = self.get_client(self.user).post(
+            f'/api/recipes/{recipe.pk}/favorite/',
+        )
+        self.assertEqual(response.status_code, 201)
+        request = APIRequestFactory().patch(f'/api/recipes/{recipe.pk}/')
+        request.user = self.author
+        serializer = RecipeWriteSerializer(
+            recipe,
+            data={
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.ingredient.id, 'amount': 7}],
+                'name': 'Новое название',
+                'text': 'Описание',
+                'cooking_time': 12,
+            },
+            partial=True,
+            context={'request': request},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def get_shopping_list(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient_id',
+                'amount',
+            ),
+        )
+
+    def test_orm_changes_update_shopping_list(self):
+        other = Recipe.objects.create(
+            name='Другой рецепт',
+            author=self.author,
+            text='Описание',
+            cooking_time=5,
+            image='recipes/media/other.png',
+        )
+        RecipeIngredients.objects.create(
+            recipe=other,
+            ingredient=self.ingredient,
+            amount=3,
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        cart = ShoppingCart.objects.create(user=self.user, recipe=other)
+        self.assertEqual(self.get_shopping_list(), {self.ingredient.id: 8})
+        Recipe.objects.get(pk=self.recipe.pk).delete()
+        self.assertEqual(self.get_shopping_list(), {self.ingredient.id: 3})
+        cart.delete()
+        self.assertEqual(self.get_shopping_list(), {})
@@ -0,0 +1,525 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+from typing import Callable, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from djoser.utils import encode_uid
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+from users import urls as users_urls
+from users.models import Follow, User
+
+PASSWORD = 'budget-password'
+PAGE_SIZES = (2, 10)
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (2, 2), (200, 120, 60)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def get_recipe_data(test):
+    return {
+        'tags': [tag.id for tag in test.tags[:2]],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in test.ingredients[:3]
+        ],
+        'name': 'Новый рецепт',
+        'image': get_image(),
+        'text': 'Описание',
+        'cooking_time': 15,
+    }
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    anonymous: Optional[int]
+    authenticated: int
+    status: int = 200
+    args: Optional[Callable] = None
+    data: Optional[Callable] = None
+    query: Optional[dict] = None
+    paginated: bool = False
+
+
+ROUTES = (
+    Route('api:api-root', 'get', 0, 1),
+    Route('api:tags-list', 'get', 1, 2),
+    Route('api:tags-detail', 'get', 1, 2, args=lambda t: (t.tags[0].id,)),
+    Route('api:ingredients-list', 'get', 1, 2, query={'name': 'Ингр'}),
+    Route(
+        'api:ingredients-detail',
+        'get',
+        1,
+        2,
+        args=lambda t: (t.ingredients[0].id,),
+    ),
+    Route('api:recipes-list', 'get', 5, 7, paginated=True),
+    Route(
+        'api:recipes-list',
+        'get',
+        5,
+        8,
+        query={'tags': 'tag-0', 'is_favorited': 1},
+        paginated=True,
+    ),
+    Route(
+        'api:recipes-list',
+        'post',
+        None,
+        18,
+        status=201,
+        data=get_recipe_data,
+    ),
+    Route('api:recipes-detail', 'get', 4, 6, args=lambda t: (t.recipe.id,)),
+    Route(
+        'api:recipes-detail',
+        'patch',
+        None,
+        16,
+        args=lambda t: (t.own_recipe.id,),
+        data=get_recipe_data,
+    ),
+    Route(
+        'api:recipes-detail',
+        'delete',
+        None,
+        16,
+        status=204,
+        args=lambda t: (t.own_recipe.id,),
+    ),
+    Route(
+        'api:recipes-favorite',
+        'post',
+        None,
+        7,
+        status=201,
+        args=lambda t: (t.recipe.id,),
+    ),
+    Route(
+        'api:recipes-favorite',
+        'delete',
+        None,
+        6,
+        status=204,
+        args=lambda t: (t.favorite_recipe.id,),
+    ),
+    Route(
+        'api:recipes-shopping-cart',
+        'post',
+        None,
+        10,
+        status=201,
+        args=lambda t: (t.recipe.id,),
+    ),
+    Route(
+        'api:recipes-shopping-cart',
+        'delete',
+        None,
+        9,
+        status=204,
+        args=lambda t: (t.favorite_recipe.id,),
+    ),
+    Route(
+        'api:recipes-favorite-bulk',
+        'post',
+        None,
+        7,
+        data=lambda t: {'recipes': [recipe.id for recipe in t.recipes]},
+    ),
+    Route(
+        'api:recipes-favorite-bulk',
+        'delete',
+        None,
+        6,
+        data=lambda t: {'recipes': [recipe.id for recipe in t.recipes]},
+    ),
+    Route(
+        'api:recipes-shopping-cart-bulk',
+        'post',
+        None,
+        10,
+        data=lambda t: {'recipes': [recipe.id for recipe in t.recipes]},
+    ),
+    Route(
+        'api:recipes-shopping-cart-bulk',
+        'delete',
+        None,
+        9,
+        data=lambda t: {'recipes': [recipe.id for recipe in t.recipes]},
+    ),
+    Route('api:recipes-download-shopping-cart', 'get', None, 2),
+    Route('users:api-root', 'get', 0, 1),
+    Route('users:user-list', 'get', 2, 4, paginated=True),
+    Route(
+        'users:user-list',
+        'post',
+        4,
+        5,
+        status=201,
+        data=lambda t: {
+            'email': 'new@example.com',
+            'username': 'new',
+            'first_name': 'Новый',
+            'last_name': 'Пользователь',
+            'password': PASSWORD,
+        },
+    ),
+    Route('users:user-detail', 'get', 1, 3, args=lambda t: (t.author.id,)),
+    Route('users:user-me', 'get', 0, 2),
+    Route(
+        'users:user-set-password',
+        'post',
+        None,
+        5,
+        status=204,
+        data=lambda t: {
+            'new_password': 'another-password',
+            'current_password': PASSWORD,
+        },
+    ),
+    Route(
+        'users:user-set-username',
+        'post',
+        None,
+        6,
+        status=204,
+        data=lambda t: {
+            'new_email': 'renamed@example.com',
+            'current_password': PASSWORD,
+        },
+    ),
+    Route(
+        'users:user-activation',
+        'post',
+        1,
+        2,
+        status=403,
+        data=lambda t: {
+            'uid': encode_uid(t.author.pk),
+            'token': default_token_generator.make_token(t.author),
+        },
+    ),
+    Route(
+        'users:user-resend-activation',
+        'post',
+        1,
+        2,
+        status=400,
+        data=lambda t: {'email': t.author.email},
+    ),
+    Route(
+        'users:user-reset-password',
+        'post',
+        1,
+        2,
+        status=204,
+        data=lambda t: {'email': t.author.email},
+    ),
+    Route(
+        'users:user-reset-password-confirm',
+        'post',
+        5,
+        6,
+        status=204,
+        data=lambda t: {
+            'uid': encode_uid(t.author.pk),
+            'token': default_token_generator.make_token(t.author),
+            'new_password': 'another-password',
+        },
+    ),
+    Route(
+        'users:user-reset-username',
+        'post',
+        1,
+        2,
+        status=204,
+        data=lambda t: {'email': t.author.email},
+    ),
+    Route(
+        'users:user-reset-username-confirm',
+        'post',
+        6,
+        7,
+        status=204,
+        data=lambda t: {
+            'uid': encode_uid(t.author.pk),
+            'token': default_token_generator.make_token(t.author),
+            'new_email': 'renamed@example.com',
+        },
+    ),
+    Route(
+        'users:subscriptions',
+        'get',
+        None,
+        4,
+        query={'recipes_limit': 3},
+        paginated=True,
+    ),
+    Route(
+        'users:subscribe',
+        'post',
+        None,
+        6,
+        status=201,
+        args=lambda t: (t.author.id,),
+    ),
+    Route(
+        'users:subscribe',
+        'delete',
+        None,
+        3,
+        status=204,
+        args=lambda t: (t.followed.id,),
+    ),
+    Route(
+        'users:login',
+        'post',
+        7,
+        8,
+        data=lambda t: {'email': t.author.email, 'password': PASSWORD},
+    ),
+    Route('users:logout', 'post', None, 3, status=204),
+)
+
+
+def get_route_names(patterns, namespace):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_route_names(pattern.url_patterns, namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}:{pattern.name}'
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    IMAGE_VARIANT_WORKERS=0,
+    SERVER_TIMING=False,
+    REPLICA_DATABASES=[],
+    DJOSER={
+        **settings.DJOSER,
+        'PASSWORD_RESET_CONFIRM_URL': 'password/reset/{uid}/{token}',
+        'USERNAME_RESET_CONFIRM_URL': 'email/reset/{uid}/{token}',
+    },
+)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(14)
+        )
+        users = list(User.objects.order_by('id'))
+        cls.user, cls.author, cls.followed, *others = users
+        cls.token = Token.objects.create(user=cls.user)
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'Тег {number}',
+                color=f'#00000{number}',
+                slug=f'tag-{number}',
+            )
+            for number in range(3)
+        )
+        cls.tags = list(Tag.objects.order_by('id'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(6)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+        Recipe.objects.bulk_create(
+            Recipe(
+                name=f'Рецепт {number}',
+                author=users[number % len(users)],
+                text='Описание',
+                cooking_time=number + 1,
+                image='recipes/media/budget.png',
+            )
+            for number in range(30)
+        )
+        cls.recipes = list(Recipe.objects.order_by('id'))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in cls.recipes
+            for tag in cls.tags[: recipe.id % len(cls.tags) + 1]
+        )
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=5)
+            for recipe in cls.recipes
+            for ingredient in cls.ingredients[: recipe.id % 4 + 2]
+        )
+        cls.own_recipe = cls.recipes[0]
+        cls.recipe = cls.recipes[1]
+        cls.favorite_recipe = cls.recipes[2]
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=cls.user, recipe=recipe)
+                for recipe in cls.recipes[2::2]
+            )
+        Recipe.objects.reconcile_counters()
+        ShoppingListItem.objects.rebuild()
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author)
+            for author in [cls.followed, *others]
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def get_client(self, authenticated):
+        client = APIClient()
+        if authenticated:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+    def get_url(self, route, page_size=None):
+        url = reverse(route.name, args=route.args(self) if route.args else ())
+        query = dict(route.query or {})
+        if page_size is not None:
+            query['limit'] = page_size
+        return url, query
+
+    def request(self, route, authenticated, page_size=None):
+        client = self.get_client(authenticated)
+        url, query = self.get_url(route, page_size)
+        data = route.data(self) if route.data else None
+        if route.method == 'get':
+            data = query
+        elif query:
+            url = f'{url}?{urlencode(query)}'
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as ctx:
+                response = getattr(client, route.method)(
+                    url,
+                    data,
+                    format=None if route.method == 'get' else 'json',
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        return response, ctx
+
+    def get_message(self, route, authenticated, ctx, reason):
+        who = 'authenticated' if authenticated else 'anonymous'
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(ctx.captured_queries, 1)
+        )
+        return (
+            f'{route.method.upper()} {route.name} ({who}): {reason}, '
+            f'{len(ctx)} queries executed:\n{queries}'
+        )
+
+    def assert_budget(self, route, authenticated, page_size=None):
+        response, ctx = self.request(route, authenticated, page_size)
+        budget, status = route.authenticated, route.status
+        if not authenticated:
+            budget, status = route.anonymous, route.status
+            if route.anonymous is None:
+                budget, status = 0, 401
+        self.assertEqual(
+            response.status_code,
+            status,
+            self.get_message(
+                route,
+                authenticated,
+                ctx,
+                f'unexpected response {getattr(response, "data", None)}',
+            ),
+        )
+        self.assertLessEqual(
+            len(ctx),
+            budget,
+            self.get_message(
+                route,
+                authenticated,
+                ctx,
+                f'budget of {budget} queries exceeded',
+            ),
+        )
+        return ctx
+
+    def test_every_route_has_budget(self):
+        names = {
+            *get_route_names(api_urls.urlpatterns, api_urls.app_name),
+            *get_route_names(users_urls.urlpatterns, users_urls.app_name),
+        }
+        covered = {route.name for route in ROUTES}
+        self.assertEqual(
+            names - covered,
+            set(),
+            'Routes without a query budget.',
+        )
+
+    def test_anonymous_query_budgets(self):
+        for route in ROUTES:
+            with self.subTest(route=route.name, method=route.method):
+                self.assert_budget(route, authenticated=False)
+
+    def test_authenticated_query_budgets(self):
+        for route in ROUTES:
+            with self.subTest(route=route.name, method=route.method):
+                self.assert_budget(route, authenticated=True)
+
+    def test_queries_do_not_scale_with_page_size(self):
+        for route in ROUTES:
+            if not route.paginated:
+                continue
+            for authenticated in (False, True):
+                if not authenticated and route.anonymous is None:
+                    continue
+                with self.subTest(
+                    route=route.name,
+                    authenticated=authenticated,
+                ):
+                    small, large = (
+                        self.assert_budget(route, authenticated, page_size)
+                        for page_size in PAGE_SIZES
+                    )
+                    self.assertEqual(
+                        len(small),
+                        len(large),
+                        self.get_message(
+                            route,
+                            authenticated,
+                            large,
+                            f'{len(small)} queries for limit={PAGE_SIZES[0]}'
+                            f' but {len(large)} for limit={PAGE_SIZES[1]}',
+                        ),
+                    )
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_urls
 from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
 
 app_name = 'api'
@@ -11,6 +12,16 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
+ASYNC_ROUTES = {
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+}
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(async_urls(router.urls, ASYNC_ROUTES))),
 ]
@@ -1,22 +1,43 @@
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.conditional import (
+    get_last_modified,
+    get_not_modified_response,
+    get_recipes_etag,
+    set_validators,
+)
+from api.filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from api.ingredient_index import ingredient_index
 from api.mixins import RetrieveListViewSet
 from api.pagination import CustomPageNumberPagination
 from api.permissions import IsAdminOwnerOrReadOnly
 from api.serializers import (
     IngredientSerializer,
     MiniRecipeSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     RecipeWriteSerializer,
     TagSerializer,
 )
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+NOT_FOUND = 'not_found'
 
 
 class TagViewSet(RetrieveListViewSet):
@@ -34,13 +55,85 @@ class IngredientViewSet(RetrieveListViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'limit': 'Лимит должен быть целым числом.'},
+                )
+            if limit < 1:
+                raise serializers.ValidationError(
+                    {'limit': 'Лимит должен быть больше 0.'},
+                )
+        return Response(
+            ingredient_index.search(
+                request.query_params.get('name', ''),
+                limit,
+            ),
+        )
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    lookup_value_regex = r'\d+'
     permission_classes = (IsAdminOwnerOrReadOnly,)
     pagination_class = CustomPageNumberPagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('favorites_count', 'id', 'cooking_time')
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        etag = get_recipes_etag(
+            request,
+            page,
+            request.get_full_path(),
+            *self.paginator.get_validator_parts(),
+        )
+        last_modified = get_last_modified(page)
+        not_modified = get_not_modified_response(
+            request,
+            etag,
+            last_modified,
+            check_modified=False,
+        )
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(page, many=True)
+        return set_validators(
+            self.get_paginated_response(serializer.data),
+            etag,
+            last_modified,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = get_recipes_etag(request, (instance,))
+        not_modified = get_not_modified_response(
+            request,
+            etag,
+            instance.updated_at,
+            check_modified=not request.user.is_authenticated,
+        )
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(instance)
+        return set_validators(
+            Response(serializer.data),
+            etag,
+            instance.updated_at,
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -50,20 +143,90 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def add_recipes(self, model, recipe_ids):
+        user = self.request.user
+        added = model.objects.add_recipes(user, recipe_ids)
+        Recipe.objects.filter(pk__in=added).change_counter(
+            model.counter_field,
+            1,
+        )
+        if model is ShoppingCart:
+            ShoppingListItem.objects.add_recipes((user.id,), list(added))
+        skipped = [
+            recipe_id for recipe_id in recipe_ids if recipe_id not in added
+        ]
+        existing = set()
+        if skipped:
+            existing = set(
+                Recipe.objects.filter(pk__in=skipped).values_list(
+                    'id',
+                    flat=True,
+                ),
+            )
+        results = {}
+        for recipe_id in recipe_ids:
+            if recipe_id in added:
+                results[recipe_id] = ADDED
+            elif recipe_id in existing:
+                results[recipe_id] = EXISTS
+            else:
+                results[recipe_id] = NOT_FOUND
+        return results
+
+    def remove_recipes(self, model, recipe_ids):
+        user = self.request.user
+        removed = model.objects.remove_recipes(user, recipe_ids)
+        Recipe.objects.filter(pk__in=removed).change_counter(
+            model.counter_field,
+            -1,
+        )
+        if model is ShoppingCart:
+            ShoppingListItem.objects.add_recipes(
+                (user.id,),
+                list(removed),
+                sign=-1,
+            )
+        return {
+            recipe_id: REMOVED if recipe_id in removed else NOT_FOUND
+            for recipe_id in recipe_ids
+        }
+
+    @transaction.atomic
     def create_delete_for_favorite_or_shop_cart(self, request, model, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
+        pk = int(pk)
         if request.method == 'POST':
-            serializer = MiniRecipeSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            if model.objects.filter(user=request.user, recipe=recipe).exists():
+            result = self.add_recipes(model, (pk,))[pk]
+            if result == NOT_FOUND:
+                raise Http404
+            if result == EXISTS:
                 raise serializers.ValidationError('Рецепт уже добавлен.')
-
-            model.objects.create(user=request.user, recipe=recipe)
+            serializer = MiniRecipeSerializer(
+                Recipe.objects.get(pk=pk),
+                context={'request': request},
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if request.method == 'DELETE':
-            get_object_or_404(model, user=request.user, recipe=pk).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if self.remove_recipes(model, (pk,))[pk] == NOT_FOUND:
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def bulk_favorite_or_shop_cart(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            results = self.add_recipes(model, recipe_ids)
+        else:
+            results = self.remove_recipes(model, recipe_ids)
+        return Response(
+            {
+                'results': [
+                    {'id': recipe_id, 'status': result}
+                    for recipe_id, result in results.items()
+                ],
+            },
+        )
 
     @action(
         detail=True,
@@ -89,33 +252,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
             pk,
         )
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='favorite',
+        url_name='favorite-bulk',
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_favorite_or_shop_cart(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_favorite_or_shop_cart(request, ShoppingCart)
+
     @action(
         detail=False,
         methods=['GET'],
         permission_classes=(permissions.IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
-        shopping_cart = (
-            ShoppingCart.objects.filter(user=request.user)
-            .select_related('recipe')
-            .prefetch_related('recipe__recipe_ingredients')
+        ingredients = request.user.shopping_list.values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount',
+        ).order_by('ingredient__name')
+        response = StreamingHttpResponse(
+            self.shopping_cart_lines(ingredients),
+            content_type='text/plain',
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename=shopping_cart.txt'
         )
-        ingredients = {}
-        for item in shopping_cart:
-            for ingredient in item.recipe.recipe_ingredients.all():
-                ingredient_id = ingredient.ingredient_id
-                if ingredient_id in ingredients:
-                    ingredients[ingredient_id] += ingredient.amount
-                else:
-                    ingredients[ingredient_id] = ingredient.amount
-
-        line = 'Ингредиент (единица измерения) - количество\n'
-        for ingredient_id, amount in ingredients.items():
-            ing = Ingredient.objects.get(pk=ingredient_id)
-            line += f'● {ing.name} ({ing.measurement_unit}) - {amount}\n'
-
-        response = HttpResponse(line, content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename=shopping_cart.txt'
         return response
+
+    @staticmethod
+    def shopping_cart_lines(ingredients):
+        yield 'Ингредиент (единица измерения) - количество\n'
+        for ingredient in ingredients.iterator():
+            yield (
+                f'● {ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]}) '
+                f'- {ingredient["amount"]}\n'
+            )
@@ -1,5 +1,104 @@
+import json
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is None or estimate < self.exact_count_limit:
+            return super().count
+        return estimate
+
+    def get_estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(
+            field,
+            request,
+            params,
+            model,
+            model_admin,
+            field_path,
+        )
+        self.admin_site = model_admin.admin_site
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def get_form_field(self):
+        return forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(
+                self.field,
+                self.admin_site,
+                attrs={'data-width': '100%'},
+            ),
+            required=False,
+        )
+
+    @property
+    def media(self):
+        return self.get_form_field().widget.media
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is not None,
+            'lookup_kwarg': self.lookup_kwarg,
+            'params': [
+                (name, value)
+                for name, value in changelist.params.items()
+                if name not in (self.lookup_kwarg, PAGE_VAR)
+            ],
+            'widget': self.get_form_field().widget.render(
+                self.lookup_kwarg,
+                self.lookup_val,
+            ),
+        }
 
 
 class BaseAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
+
+
+class LargeTableAdmin(BaseAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, 'context_data', None) or {}
+        if 'cl' in context:
+            for spec in context['cl'].filter_specs:
+                if isinstance(spec, AutocompleteFilter):
+                    context['media'] += spec.media
+        return response
@@ -1,7 +1,16 @@
 import os
 
 from django.core.asgi import get_asgi_application
+from django.db import DatabaseError
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('SERVER_MODE', 'asgi')
 
 application = get_asgi_application()
+
+try:
+    from api.ingredient_index import ingredient_index
+
+    ingredient_index.refresh()
+except DatabaseError:
+    pass
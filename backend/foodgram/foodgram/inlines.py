@@ -7,3 +7,14 @@ class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredients
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related(
+                'recipe',
+                'ingredient',
+            )
+        )
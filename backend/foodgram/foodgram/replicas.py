@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    InterfaceError,
+    OperationalError,
+    connections,
+)
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'db:primary:{}'
+
+current_routing = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    __slots__ = ('use_replica', 'replica')
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+
+
+class ReplicaPool:
+    def __init__(self, aliases):
+        self.aliases = tuple(aliases)
+        self.ejected = {}
+        self.counter = itertools.count()
+
+    def get_healthy(self):
+        now = time.monotonic()
+        return [
+            alias
+            for alias in self.aliases
+            if self.ejected.get(alias, 0) <= now
+        ]
+
+    def choose(self):
+        healthy = self.get_healthy()
+        while healthy:
+            alias = healthy[next(self.counter) % len(healthy)]
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                self.eject(alias)
+                healthy.remove(alias)
+                continue
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def eject(self, alias):
+        self.ejected[alias] = (
+            time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+        )
+        logger.warning(
+            'replica %s ejected for %s s',
+            alias,
+            settings.DB_REPLICA_RETRY_SECONDS,
+        )
+
+
+@lru_cache(maxsize=None)
+def get_replica_pool():
+    return ReplicaPool(settings.REPLICA_DATABASES)
+
+
+def eject_failed_replica(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except (InterfaceError, OperationalError):
+        get_replica_pool().eject(context['connection'].alias)
+        raise
+
+
+def install_replica_watcher(sender, connection, **kwargs):
+    if (
+        connection.alias in settings.REPLICA_DATABASES
+        and eject_failed_replica not in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(eject_failed_replica)
+
+
+def get_pin_key(request):
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return PIN_KEY.format(hashlib.sha256(credentials.encode()).hexdigest())
+
+
+def is_pinned(pin_key):
+    return pin_key is not None and bool(cache.get(pin_key))
+
+
+def pin_to_primary(pin_key):
+    if pin_key is not None:
+        cache.set(pin_key, True, timeout=settings.DB_REPLICA_PIN_SECONDS)
+
+
+def using_replica():
+    state = current_routing.get()
+    return state is not None and state.use_replica
+
+
+@contextmanager
+def read_from_primary():
+    token = current_routing.set(RoutingState(use_replica=False))
+    try:
+        yield
+    finally:
+        current_routing.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if state is None or not state.use_replica:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = get_replica_pool().choose()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(
+            install_replica_watcher,
+            dispatch_uid='replica_watcher',
+        )
+        for connection in connections.all():
+            install_replica_watcher(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        pin_key = get_pin_key(request)
+        safe = request.method in SAFE_METHODS
+        use_replica = safe and not is_pinned(pin_key)
+        token = current_routing.set(RoutingState(use_replica))
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if not safe:
+            pin_to_primary(pin_key)
+        return response
+
+    async def __acall__(self, request):
+        pin_key = get_pin_key(request)
+        safe = request.method in SAFE_METHODS
+        use_replica = safe
+        if safe and pin_key is not None:
+            use_replica = not await sync_to_async(
+                is_pinned,
+                thread_sensitive=False,
+            )(pin_key)
+        token = current_routing.set(RoutingState(use_replica))
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if not safe and pin_key is not None:
+            await sync_to_async(pin_to_primary, thread_sensitive=False)(
+                pin_key,
+            )
+        return response
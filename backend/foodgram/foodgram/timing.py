@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started',
+        'view_started',
+        'view_name',
+        'queries',
+        'db',
+        'serialize',
+        'serialize_started',
+        'serialize_depth',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_name = None
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serialize_started = None
+        self.serialize_depth = 0
+
+    def start_serialize(self):
+        if not self.serialize_depth:
+            self.serialize_started = time.perf_counter()
+        self.serialize_depth += 1
+
+    def finish_serialize(self, response=None):
+        if not self.serialize_depth:
+            return
+        self.serialize_depth -= 1
+        if not self.serialize_depth:
+            self.serialize += time.perf_counter() - self.serialize_started
+
+    def get_timings(self):
+        finished = time.perf_counter()
+        view = 0.0
+        if self.view_started is not None:
+            view = finished - self.view_started - self.serialize
+        return {
+            'db': self.db,
+            'serialize': self.serialize,
+            'view': max(view, 0.0),
+            'total': finished - self.started,
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def measure_serialize():
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    metrics.start_serialize()
+    try:
+        yield
+    finally:
+        metrics.finish_serialize()
+
+
+def render_response(response):
+    with measure_serialize():
+        response.render()
+
+
+def get_view_name(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    name = f'{view_class.__module__}.{view_class.__name__}'
+    action = (getattr(view_func, 'actions', None) or {}).get(
+        request.method.lower(),
+    )
+    return f'{name}.{action}' if action else name
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.process_view_async
+            self.process_template_response = (
+                self.process_template_response_async
+            )
+        connection_created.connect(
+            install_query_recorder,
+            dispatch_uid='server_timing_query_recorder',
+        )
+        for connection in connections.all():
+            install_query_recorder(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.add_timings(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.add_timings(request, response, metrics)
+
+    def add_timings(self, request, response, metrics):
+        timings = metrics.get_timings()
+        db_time = timings['db'] * 1000
+        entries = [f'db;dur={db_time:.1f};desc="queries: {metrics.queries}"']
+        entries.extend(
+            f'{name};dur={timings[name] * 1000:.1f}'
+            for name in ('serialize', 'view', 'total')
+        )
+        response['Server-Timing'] = ', '.join(entries)
+        if (
+            timings['total'] * 1000 >= settings.SLOW_REQUEST_MS
+            or metrics.queries >= settings.SLOW_REQUEST_QUERIES
+        ):
+            self.log_request(request, response, metrics, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view(request, view_func)
+
+    async def process_view_async(
+        self,
+        request,
+        view_func,
+        view_args,
+        view_kwargs,
+    ):
+        self.start_view(request, view_func)
+
+    def process_template_response(self, request, response):
+        return self.watch_render(response)
+
+    async def process_template_response_async(self, request, response):
+        return self.watch_render(response)
+
+    @staticmethod
+    def start_view(request, view_func):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view_name = get_view_name(request, view_func)
+            metrics.view_started = time.perf_counter()
+
+    @staticmethod
+    def watch_render(response):
+        metrics = current_metrics.get()
+        if metrics is not None and not response.is_rendered:
+            metrics.start_serialize()
+            response.add_post_render_callback(metrics.finish_serialize)
+        return response
+
+    @staticmethod
+    def log_request(request, response, metrics, timings):
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view_name,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            **{
+                f'{name}_ms': round(value * 1000, 1)
+                for name, value in timings.items()
+            },
+        }
+        logger.warning(
+            'slow request %s',
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'request_metrics': fields},
+        )
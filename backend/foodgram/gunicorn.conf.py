@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+server_mode = os.getenv('SERVER_MODE', default='wsgi')
+cpu_count = multiprocessing.cpu_count()
+cache_backend = os.getenv('CACHE_BACKEND', default=PROCESS_LOCAL_CACHES[0])
+shared_cache = cache_backend not in PROCESS_LOCAL_CACHES
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', default=30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', default=0))
+
+if server_mode == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    default_workers = cpu_count
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    threads = int(os.getenv('GUNICORN_THREADS', default=1))
+    worker_class = 'gthread' if threads > 1 else 'sync'
+    default_workers = cpu_count * 2 + 1
+
+workers = int(
+    os.getenv(
+        'GUNICORN_WORKERS',
+        default=default_workers if shared_cache else 1,
+    ),
+)
+if workers > 1 and not shared_cache:
+    raise RuntimeError(
+        f'Кэш {cache_backend} не общий для процессов: для '
+        'GUNICORN_WORKERS > 1 задайте общий CACHE_BACKEND.',
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from foodgram.admin import AutocompleteFilter, LargeTableAdmin
 from foodgram.inlines import RecipeIngredientInline
 from recipes.models import (
     Favorite,
@@ -7,6 +8,7 @@ from recipes.models import (
     Recipe,
     RecipeIngredients,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
 )
 
@@ -23,37 +25,79 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
+    search_fields = ('name',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('author', 'name', 'cooking_time')
-    search_fields = ('name', 'author', 'tags')
-    list_filter = ('author', 'name', 'tags')
+class RecipeAdmin(LargeTableAdmin):
+    list_display = (
+        'author',
+        'name',
+        'cooking_time',
+        'favorites_count',
+        'shopping_cart_count',
+    )
+    list_select_related = ('author',)
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
+    search_fields = ('name', 'author__email', 'author__username')
+    list_filter = (('author', AutocompleteFilter), 'tags')
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngredientInline,)
 
 
 @admin.register(RecipeIngredients)
-class IngredientInRecipe(admin.ModelAdmin):
+class IngredientInRecipe(LargeTableAdmin):
     list_display = (
         'recipe',
         'ingredient',
         'amount',
     )
+    list_select_related = ('recipe', 'ingredient')
+    list_filter = (
+        ('recipe', AutocompleteFilter),
+        ('ingredient', AutocompleteFilter),
+    )
+    autocomplete_fields = ('recipe', 'ingredient')
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    list_filter = (
+        ('user', AutocompleteFilter),
+        ('recipe', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    list_filter = (
+        ('user', AutocompleteFilter),
+        ('recipe', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(LargeTableAdmin):
+    list_display = (
+        'user',
+        'ingredient',
+        'amount',
+    )
+    list_select_related = ('user', 'ingredient')
+    list_filter = (
+        ('user', AutocompleteFilter),
+        ('ingredient', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'ingredient')
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from recipes.search import create_search_indexes
+        from recipes.signals import assign_tag_masks
+
+        post_migrate.connect(create_search_indexes, sender=self)
+        post_migrate.connect(assign_tag_masks, sender=self)
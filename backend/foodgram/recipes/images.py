@@ -0,0 +1,107 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (600, 600),
+    'detail': (1200, 1200),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_variant_name(image_name, variant, extension):
+    root, _ = os.path.splitext(image_name)
+    return f'{root}_{variant}.{extension}'
+
+
+def get_variant_urls(recipe):
+    if not recipe.image:
+        return None
+    ready = recipe.image_variants_source == recipe.image.name
+    return {
+        variant: {
+            extension: (
+                default_storage.url(
+                    get_variant_name(recipe.image.name, variant, extension),
+                )
+                if ready
+                else recipe.image.url
+            )
+            for extension in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def generate_variants(image_name):
+    with default_storage.open(image_name, 'rb') as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            if image_format == 'JPEG' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            name = get_variant_name(image_name, variant, extension)
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def process_recipe_image(recipe_id, image_name):
+    try:
+        generate_variants(image_name)
+    except (OSError, ValueError):
+        logger.exception('Не удалось обработать картинку %s', image_name)
+        return False
+    recipe = Recipe.objects.filter(pk=recipe_id, image=image_name).first()
+    if recipe is None:
+        return False
+    recipe.image_variants_source = image_name
+    recipe.save(update_fields=('image_variants_source', 'updated_at'))
+    return True
+
+
+def run_task(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось сохранить копии картинки %s', image_name)
+    finally:
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_VARIANT_WORKERS,
+        thread_name_prefix='recipe-images',
+    )
+
+
+def schedule_image_variants(recipe):
+    image_name = recipe.image.name
+    if settings.IMAGE_VARIANT_WORKERS:
+        get_executor().submit(run_task, recipe.id, image_name)
+    elif process_recipe_image(recipe.id, image_name):
+        recipe.image_variants_source = image_name
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для уже обработанных рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').order_by('id')
+        processed = 0
+        for recipe_id, image_name, source in recipes.values_list(
+            'id',
+            'image',
+            'image_variants_source',
+        ).iterator():
+            if image_name == source and not options['all']:
+                continue
+            process_recipe_image(recipe_id, image_name)
+            processed += 1
+            self.stdout.write(f'Рецепт {recipe_id}: {image_name}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано картинок: {processed}.'),
+        )
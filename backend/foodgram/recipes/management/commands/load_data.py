@@ -1,28 +1,150 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
-from recipes.models import Ingredient
+from recipes.models import Ingredient, Tag
+from recipes.signals import catalog_changed
+
+MODELS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit')),
+    'tags': (Tag, ('name', 'color', 'slug')),
+}
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        if not row or tuple(row) == fields:
+            continue
+        if len(row) != len(fields):
+            raise CommandError(f'Некорректная строка: {row}')
+        yield dict(zip(fields, row))
+
+
+def read_json(file, fields):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    while True:
+        position = skip_separators(buffer, position)
+        try:
+            obj, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                if buffer[position:].strip():
+                    raise CommandError('Некорректный JSON-файл.')
+                return
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield {field: obj[field] for field in fields}
+
+
+def skip_separators(buffer, position):
+    while position < len(buffer) and buffer[position] in '[], \t\r\n':
+        position += 1
+    return position
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
-        with open(
-            f'{data_path}/data/ingredients.csv',
-            'r',
-            encoding='utf-8',
-        ) as file:
-            reader = csv.reader(file)
-            next(reader)
-            for row in reader:
-                name, measurement_unit = row
-                if not Ingredient.objects.filter(name=name).exists():
-                    Ingredient.objects.create(
-                        name=name,
-                        measurement_unit=measurement_unit,
-                    )
+    help = 'Загружает ингредиенты или теги из CSV/JSON-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=MODELS,
+            default='ingredients',
+            help='Что загружать: ingredients или tags.',
+        )
+        parser.add_argument(
+            '--path',
+            type=Path,
+            help='Путь к файлу (по умолчанию data/<model>.csv).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной пачке.',
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Обновлять существующие записи с тем же названием.',
+        )
+
+    def handle(self, *args, **options):
+        model, fields = MODELS[options['model']]
+        path = options['path'] or (
+            Path(settings.BASE_DIR) / 'data' / f'{options["model"]}.csv'
+        )
+        reader = READERS.get(path.suffix)
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше 0.')
+        started = time.monotonic()
+        total = updated = 0
+        with open(path, 'r', encoding='utf-8') as file, transaction.atomic():
+            rows = reader(file, fields)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                updated += self.save_batch(
+                    model,
+                    fields,
+                    batch,
+                    options['update'],
+                )
+                total += len(batch)
+                self.stdout.write(
+                    f'Обработано строк: {total} '
+                    f'({total / (time.monotonic() - started):.0f} строк/с)',
+                )
+            catalog_changed.send(sender=model)
         self.stdout.write(
-            self.style.SUCCESS('Загрузка ингредиентов выполнена.'),
+            self.style.SUCCESS(
+                f'Загрузка выполнена: {total} строк, '
+                f'обновлено {updated}, '
+                f'{time.monotonic() - started:.2f} с.',
+            ),
         )
+
+    def save_batch(self, model, fields, batch, update):
+        updated = []
+        if update:
+            existing = model.objects.in_bulk(
+                [row['name'] for row in batch],
+                field_name='name',
+            )
+            for row in batch:
+                obj = existing.get(row['name'])
+                if obj is None:
+                    continue
+                if any(getattr(obj, field) != row[field] for field in fields):
+                    for field in fields:
+                        setattr(obj, field, row[field])
+                    updated.append(obj)
+            model.objects.bulk_update(updated, fields[1:])
+        try:
+            model.objects.bulk_create(
+                (model(**row) for row in batch),
+                ignore_conflicts=True,
+            )
+        except ValidationError as error:
+            raise CommandError(' '.join(error.messages))
+        return len(updated)
@@ -0,0 +1,64 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает или проверяет итоговые списки покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить сохранённые итоги с корзинами.',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='id пользователя (можно указать несколько раз).',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if options['check']:
+            self.check_totals(user_ids)
+            return
+        with transaction.atomic():
+            ShoppingListItem.objects.rebuild(user_ids)
+        self.stdout.write(
+            self.style.SUCCESS('Списки покупок пересчитаны.'),
+        )
+
+    def check_totals(self, user_ids):
+        expected = ShoppingListItem.objects.calculate(user_ids)
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in items.values_list(
+                'user_id',
+                'ingredient_id',
+                'amount',
+            )
+        }
+        mismatches = [
+            (key, stored.get(key), expected.get(key))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), actual, amount in sorted(mismatches):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'сохранено {actual}, ожидается {amount}',
+            )
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}.',
+            )
+        self.stdout.write(
+            self.style.SUCCESS('Списки покупок совпадают с корзинами.'),
+        )
@@ -0,0 +1,75 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipes.models import Recipe, Tag
+
+FIELDS = {
+    'favorites_count': 'actual_favorites_count',
+    'shopping_cart_count': 'actual_shopping_cart_count',
+    'tags_mask': 'actual_tags_mask',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики избранного и корзин и маски тегов '
+        'с фактическими данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.check_tag_masks(options['check'])
+            mismatches = list(
+                Recipe.objects.with_actual_counters()
+                .filter(self.get_mismatch_filter())
+                .values('id', *FIELDS, *FIELDS.values())
+                .order_by('id'),
+            )
+            for recipe in mismatches:
+                self.stdout.write(
+                    f'Рецепт {recipe["id"]}: '
+                    + ', '.join(
+                        f'{field} {recipe[field]} вместо {recipe[actual]}'
+                        for field, actual in FIELDS.items()
+                        if recipe[field] != recipe[actual]
+                    ),
+                )
+            if options['check']:
+                if mismatches:
+                    raise CommandError(
+                        f'Найдено расхождений: {len(mismatches)}.',
+                    )
+            else:
+                Recipe.objects.filter(
+                    pk__in=[recipe['id'] for recipe in mismatches],
+                ).reconcile_counters()
+        if options['check']:
+            message = 'Счётчики совпадают с фактическими данными.'
+        else:
+            message = f'Исправлено рецептов: {len(mismatches)}.'
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def check_tag_masks(self, check):
+        if not check:
+            tags = Tag.objects.assign_missing_masks()
+            if tags:
+                self.stdout.write(f'Назначены биты тегам: {len(tags)}.')
+            return
+        missing = Tag.objects.filter(mask=None).count()
+        if missing:
+            raise CommandError(f'Тегов без бита в маске: {missing}.')
+
+    @staticmethod
+    def get_mismatch_filter():
+        mismatch = Q()
+        for field, actual in FIELDS.items():
+            mismatch |= ~Q(**{field: F(actual)})
+        return mismatch
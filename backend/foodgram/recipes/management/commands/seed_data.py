@@ -0,0 +1,331 @@
+import random
+import time
+import uuid
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.signals import catalog_changed
+from users.models import Follow, User
+
+IMAGE_NAME = 'recipes/media/seed.png'
+DISHES = ('Суп', 'Салат', 'Рагу', 'Запеканка', 'Пирог', 'Каша', 'Паста')
+
+
+def get_cum_weights(size, exponent):
+    return list(
+        accumulate(1 / rank**exponent for rank in range(1, size + 1)),
+    )
+
+
+def pick(rng, items, cum_weights, count):
+    count = min(count, len(items))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.update(
+            rng.choices(items, cum_weights=cum_weights, k=count - len(chosen)),
+        )
+    return chosen
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями и рецептами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=7,
+            help='Среднее количество ингредиентов в рецепте.',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Среднее количество избранных рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--carts',
+            type=int,
+            default=5,
+            help='Среднее количество рецептов в корзине пользователя.',
+        )
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=10,
+            help='Среднее количество подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=8,
+            help='Сколько тегов должно быть в базе.',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--seed', type=int, help='Зерно генератора.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше 0.')
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт.')
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.run = uuid.UUID(int=self.rng.getrandbits(128)).hex[:8]
+        self.started = time.monotonic()
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты: manage.py load_data.',
+            )
+        tag_ids = self.create_tags()
+        user_ids = self.create_users()
+        recipe_ids = self.create_recipes(user_ids, ingredient_ids, tag_ids)
+        self.create_links(Favorite, user_ids, recipe_ids, 'favorites')
+        self.create_links(ShoppingCart, user_ids, recipe_ids, 'carts')
+        self.create_follows(user_ids)
+        self.finish(user_ids, recipe_ids)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Данные созданы (метка {self.run}) '
+                f'за {time.monotonic() - self.started:.1f} с.',
+            ),
+        )
+
+    def report(self, name, count, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'{name}: {count} ({count / elapsed:.0f} строк/с)',
+        )
+
+    def get_count(self, average):
+        return self.rng.randint(0, average * 2) if average else 0
+
+    def create_tags(self):
+        missing = self.options['tags'] - Tag.objects.count()
+        if missing > 0:
+            try:
+                Tag.objects.bulk_create(
+                    (
+                        Tag(
+                            name=f'Тег {self.run}-{number}',
+                            color=f'#{self.rng.getrandbits(24):06X}',
+                            slug=f'tag-{self.run}-{number}',
+                        )
+                        for number in range(missing)
+                    ),
+                    ignore_conflicts=True,
+                )
+            except ValidationError as error:
+                raise CommandError(' '.join(error.messages))
+            catalog_changed.send(sender=Tag)
+        self.tag_masks = dict(Tag.objects.values_list('id', 'mask'))
+        return list(self.tag_masks)
+
+    def create_users(self):
+        started = time.monotonic()
+        password = make_password(self.options['password'])
+        emails = [
+            f'user{number}@{self.run}.seed.example.com'
+            for number in range(self.options['users'])
+        ]
+        user_ids = []
+        for batch in chunks(emails, self.options['batch_size']):
+            User.objects.bulk_create(
+                User(
+                    email=email,
+                    username=email.split('@')[0],
+                    first_name='Пользователь',
+                    last_name=email.split('@')[0],
+                    password=password,
+                )
+                for email in batch
+            )
+            user_ids.extend(
+                User.objects.filter(email__in=batch).values_list(
+                    'id',
+                    flat=True,
+                ),
+            )
+        self.report('Пользователи', len(user_ids), started)
+        return user_ids
+
+    def create_image(self):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (1200, 800), (200, 120, 60)).save(buffer, 'PNG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def create_recipes(self, user_ids, ingredient_ids, tag_ids):
+        started = time.monotonic()
+        self.image = self.create_image()
+        skew = self.options['skew']
+        self.authors = self.rng.sample(user_ids, len(user_ids))
+        self.author_weights = get_cum_weights(len(self.authors), skew)
+        self.ingredients = self.rng.sample(ingredient_ids, len(ingredient_ids))
+        self.ingredient_weights = get_cum_weights(len(self.ingredients), skew)
+        self.tags = tag_ids
+        self.tag_weights = get_cum_weights(len(tag_ids), skew)
+        self.ingredient_names = dict(
+            Ingredient.objects.filter(
+                id__in=self.ingredients[:50],
+            ).values_list('id', 'name'),
+        )
+        recipe_ids = []
+        links = 0
+        numbers = range(self.options['recipes'])
+        for batch in chunks(numbers, self.options['batch_size']):
+            recipes = dict(self.build_recipe(number) for number in batch)
+            links += self.save_recipes(recipes)
+            recipe_ids.extend(recipe.id for recipe, _, _ in recipes.values())
+        self.report('Рецепты', len(recipe_ids), started)
+        self.report('Ингредиенты и теги рецептов', links, started)
+        return recipe_ids
+
+    def build_recipe(self, number):
+        ingredient_ids = pick(
+            self.rng,
+            self.ingredients,
+            self.ingredient_weights,
+            max(self.get_count(self.options['ingredients_per_recipe']), 1),
+        )
+        tag_ids = pick(
+            self.rng,
+            self.tags,
+            self.tag_weights,
+            self.rng.randint(1, 3),
+        )
+        main = next(
+            (
+                self.ingredient_names[pk]
+                for pk in ingredient_ids
+                if pk in self.ingredient_names
+            ),
+            'ассорти',
+        )
+        name = f'{self.rng.choice(DISHES)}: {main} #{self.run}-{number}'
+        recipe = Recipe(
+            name=name,
+            author_id=self.rng.choices(
+                self.authors,
+                cum_weights=self.author_weights,
+            )[0],
+            text=f'Синтетический рецепт с ингредиентом «{main}».',
+            cooking_time=min(
+                max(int(self.rng.lognormvariate(3.3, 0.6)), 1),
+                300,
+            ),
+            image=self.image,
+            tags_mask=sum(self.tag_masks[tag_id] for tag_id in tag_ids),
+        )
+        return name, (recipe, ingredient_ids, tag_ids)
+
+    @transaction.atomic
+    def save_recipes(self, recipes):
+        Recipe.objects.bulk_create(recipe for recipe, _, _ in recipes.values())
+        ids = dict(
+            Recipe.objects.filter(name__in=recipes).values_list('name', 'id'),
+        )
+        for name, (recipe, _, _) in recipes.items():
+            recipe.id = ids[name]
+        recipe_ingredients = [
+            RecipeIngredients(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient_id,
+                amount=self.rng.choice((1, 2, 5, 10, 50, 100, 200, 500)),
+            )
+            for recipe, ingredient_ids, _ in recipes.values()
+            for ingredient_id in ingredient_ids
+        ]
+        recipe_tags = [
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe, _, tag_ids in recipes.values()
+            for tag_id in tag_ids
+        ]
+        RecipeIngredients.objects.bulk_create(recipe_ingredients)
+        Recipe.tags.through.objects.bulk_create(recipe_tags)
+        return len(recipe_ingredients) + len(recipe_tags)
+
+    def create_links(self, model, user_ids, recipe_ids, option):
+        started = time.monotonic()
+        recipes = self.rng.sample(recipe_ids, len(recipe_ids))
+        weights = get_cum_weights(len(recipes), self.options['skew'])
+        total = 0
+        for batch in chunks(user_ids, self.options['batch_size']):
+            links = [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in batch
+                for recipe_id in pick(
+                    self.rng,
+                    recipes,
+                    weights,
+                    self.get_count(self.options[option]),
+                )
+            ]
+            model.objects.bulk_create(links, ignore_conflicts=True)
+            total += len(links)
+        name = model._meta.verbose_name_plural.capitalize()
+        self.report(name, total, started)
+
+    def create_follows(self, user_ids):
+        started = time.monotonic()
+        authors = self.rng.sample(user_ids, len(user_ids))
+        weights = get_cum_weights(len(authors), self.options['skew'])
+        total = 0
+        for batch in chunks(user_ids, self.options['batch_size']):
+            follows = [
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in batch
+                for author_id in pick(
+                    self.rng,
+                    authors,
+                    weights,
+                    self.get_count(self.options['follows']),
+                )
+                if author_id != user_id
+            ]
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+            total += len(follows)
+        self.report('Подписки', total, started)
+
+    def finish(self, user_ids, recipe_ids):
+        started = time.monotonic()
+        for batch in chunks(recipe_ids, self.options['batch_size']):
+            Recipe.objects.filter(pk__in=batch).reconcile_counters()
+        for batch in chunks(user_ids, self.options['batch_size']):
+            with transaction.atomic():
+                ShoppingListItem.objects.rebuild(batch)
+        self.report('Счётчики и списки покупок', len(recipe_ids), started)
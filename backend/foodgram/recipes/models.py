@@ -1,9 +1,15 @@
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models, router
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
 from users.models import User
 
+TAG_MASK_BITS = 63
+TAG_UNIQUE_FIELDS = ('name', 'color', 'slug')
+
 
 class NameModel(models.Model):
     name = models.CharField('название', max_length=200, unique=True)
@@ -15,6 +21,58 @@ class NameModel(models.Model):
         return self.name
 
 
+class TagQuerySet(models.QuerySet):
+    def get_mask(self):
+        return sum(self.exclude(mask=None).values_list('mask', flat=True))
+
+    def assign_masks(self, tags):
+        missing = [tag for tag in tags if tag.mask is None]
+        if not missing:
+            return
+        used = set(self.model.objects.values_list('mask', flat=True))
+        used.update(tag.mask for tag in tags)
+        free = [
+            1 << bit for bit in range(TAG_MASK_BITS) if 1 << bit not in used
+        ]
+        if len(free) < len(missing):
+            raise ValidationError(
+                f'Нельзя создать больше {TAG_MASK_BITS} тегов.',
+            )
+        for tag, mask in zip(missing, free):
+            tag.mask = mask
+
+    def assign_missing_masks(self):
+        tags = list(self.filter(mask=None).order_by('id'))
+        self.assign_masks(tags)
+        self.bulk_update(tags, ('mask',))
+        return tags
+
+    def get_new_tags(self, tags):
+        taken = {field: set() for field in TAG_UNIQUE_FIELDS}
+        lookups = models.Q()
+        for field in TAG_UNIQUE_FIELDS:
+            lookups |= models.Q(
+                **{f'{field}__in': [getattr(tag, field) for tag in tags]},
+            )
+        for row in self.filter(lookups).values(*TAG_UNIQUE_FIELDS):
+            for field, value in row.items():
+                taken[field].add(value)
+        new_tags = []
+        for tag in tags:
+            values = {field: getattr(tag, field) for field in taken}
+            if any(value in taken[field] for field, value in values.items()):
+                continue
+            new_tags.append(tag)
+            for field, value in values.items():
+                taken[field].add(value)
+        return new_tags
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        self.assign_masks(self.get_new_tags(objs))
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Tag(NameModel):
     color = models.CharField('цвет в HEX', max_length=7, unique=True)
     slug = models.CharField(
@@ -28,12 +86,30 @@ class Tag(NameModel):
             ),
         ],
     )
+    mask = models.BigIntegerField(
+        'бит в маске тегов рецепта',
+        null=True,
+        unique=True,
+        editable=False,
+    )
+
+    objects = TagQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'тег'
         verbose_name_plural = 'теги'
         ordering = ('name',)
 
+    def clean(self):
+        super().clean()
+        if self.mask is None:
+            Tag.objects.assign_masks([self])
+
+    def save(self, *args, **kwargs):
+        if self.mask is None:
+            Tag.objects.assign_masks([self])
+        super().save(*args, **kwargs)
+
 
 class Ingredient(NameModel):
     measurement_unit = models.CharField('единица измерения', max_length=200)
@@ -44,6 +120,81 @@ class Ingredient(NameModel):
         ordering = ('name',)
 
 
+class RecipeQuerySet(models.QuerySet):
+    def touch(self, **fields):
+        return self.update(updated_at=timezone.now(), **fields)
+
+    def change_counter(self, field, delta):
+        return self.update(**{field: Greatest(models.F(field) + delta, 0)})
+
+    def get_actual_counters(self):
+        counters = {
+            model.counter_field: Coalesce(
+                models.Subquery(
+                    model.objects.filter(recipe=models.OuterRef('pk'))
+                    .order_by()
+                    .values('recipe')
+                    .annotate(total=models.Count('pk'))
+                    .values('total'),
+                ),
+                0,
+            )
+            for model in (Favorite, ShoppingCart)
+        }
+        counters['tags_mask'] = self.get_actual_tags_mask()
+        return counters
+
+    def get_actual_tags_mask(self):
+        return Coalesce(
+            models.Subquery(
+                Recipe.tags.through.objects.filter(
+                    recipe=models.OuterRef('pk'),
+                )
+                .order_by()
+                .values('recipe')
+                .annotate(total=models.Sum('tag__mask'))
+                .values('total'),
+            ),
+            0,
+            output_field=models.BigIntegerField(),
+        )
+
+    def with_actual_counters(self):
+        return self.annotate(
+            **{
+                f'actual_{field}': counter
+                for field, counter in self.get_actual_counters().items()
+            },
+        )
+
+    def reconcile_counters(self):
+        return self.update(**self.get_actual_counters())
+
+    def with_any_tag(self, mask):
+        return self.alias(
+            matched_tags=models.F('tags_mask').bitand(mask),
+        ).filter(matched_tags__gt=0)
+
+    @staticmethod
+    def get_user_flag(model, user):
+        return models.Exists(
+            model.objects.filter(user=user, recipe=models.OuterRef('pk')),
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=self.get_user_flag(Favorite, user),
+            is_in_shopping_cart=self.get_user_flag(ShoppingCart, user),
+        )
+
+    def filter_user_flag(self, model, user):
+        if not user.is_authenticated:
+            return self.none()
+        return self.filter(self.get_user_flag(model, user))
+
+
 class Recipe(NameModel):
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -52,6 +203,12 @@ class Recipe(NameModel):
     )
     tags = models.ManyToManyField(Tag, verbose_name='список id тегов')
     image = models.ImageField('картинка', upload_to='recipes/media/')
+    image_variants_source = models.CharField(
+        'картинка, для которой готовы уменьшенные копии',
+        max_length=100,
+        blank=True,
+        editable=False,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -62,12 +219,60 @@ class Recipe(NameModel):
         'время приготовления (в минутах)',
         validators=(MinValueValidator(settings.MIN_FIELD_RESTRICTION),),
     )
+    updated_at = models.DateTimeField('дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'в избранном',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'в корзинах',
+        default=0,
+        editable=False,
+    )
+    tags_mask = models.BigIntegerField(
+        'маска тегов',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'shopping_cart_count', 'tags_mask')
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
         default_related_name = 'recipes'
         ordering = ('-id',)
+        indexes = (
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popularity_idx',
+            ),
+            models.Index(
+                fields=('cooking_time', '-id'),
+                name='recipe_cooking_time_idx',
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        if (
+            self._state.adding
+            or args
+            or kwargs.get('force_insert')
+            or kwargs.get('update_fields') is not None
+        ):
+            return super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        kwargs['update_fields'] = [
+            field.attname
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname not in deferred
+            and field.name not in self.counter_fields
+        ]
+        return super().save(**kwargs)
 
 
 class RecipeIngredients(models.Model):
@@ -102,6 +307,61 @@ class RecipeIngredients(models.Model):
         return f'В рецепте {self.recipe} содержится {self.ingredient}'
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    def get_connection(self):
+        return connections[router.db_for_write(self.model)]
+
+    def add_recipes(self, user, recipe_ids):
+        connection = self.get_connection()
+        if connection.vendor != 'postgresql':
+            existing = self.filter(
+                user=user,
+                recipe_id__in=recipe_ids,
+            ).values('recipe_id')
+            added = set(
+                Recipe.objects.filter(pk__in=recipe_ids)
+                .exclude(pk__in=existing)
+                .values_list('id', flat=True),
+            )
+            self.bulk_create(
+                (
+                    self.model(user=user, recipe_id=recipe_id)
+                    for recipe_id in added
+                ),
+                ignore_conflicts=True,
+            )
+            return added
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote_name(self.model._meta.db_table)} '
+                '(user_id, recipe_id) '
+                f'SELECT %s, id FROM {quote_name(Recipe._meta.db_table)} '
+                'WHERE id = ANY(%s) '
+                'ON CONFLICT DO NOTHING RETURNING recipe_id',
+                (user.pk, list(recipe_ids)),
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+    def remove_recipes(self, user, recipe_ids):
+        connection = self.get_connection()
+        if connection.vendor != 'postgresql':
+            links = self.filter(user=user, recipe_id__in=recipe_ids)
+            removed = set(links.values_list('recipe_id', flat=True))
+            links = links.filter(recipe_id__in=removed)
+            links._raw_delete(links.db)
+            return removed
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM '
+                f'{connection.ops.quote_name(self.model._meta.db_table)} '
+                'WHERE user_id = %s AND recipe_id = ANY(%s) '
+                'RETURNING recipe_id',
+                (user.pk, list(recipe_ids)),
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
 class UserRecipeModel(models.Model):
     user = models.ForeignKey(
         User,
@@ -114,11 +374,15 @@ class UserRecipeModel(models.Model):
         verbose_name='рецепт',
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta:
         abstract = True
 
 
 class Favorite(UserRecipeModel):
+    counter_field = 'favorites_count'
+
     class Meta:
         verbose_name = 'избранное'
         verbose_name_plural = 'избранное'
@@ -138,6 +402,8 @@ class Favorite(UserRecipeModel):
 
 
 class ShoppingCart(UserRecipeModel):
+    counter_field = 'shopping_cart_count'
+
     class Meta:
         verbose_name = 'покупка'
         verbose_name_plural = 'покупки'
@@ -153,3 +419,164 @@ class ShoppingCart(UserRecipeModel):
 
     def __str__(self):
         return f'Рецепт {self.recipe} в списке покупок у {self.user}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    def add_amounts(self, user_ids, amounts):
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items()
+            if amount
+        }
+        if not user_ids or not amounts:
+            return
+        connection = connections[router.db_for_write(self.model)]
+        if connection.vendor == 'postgresql':
+            self.upsert_amounts(connection, user_ids, amounts)
+            return
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update()
+            .filter(user_id__in=user_ids, ingredient_id__in=amounts)
+            .order_by()
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, amount in amounts.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if amount > 0:
+                        to_create.append(
+                            self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                amount=amount,
+                            ),
+                        )
+                    continue
+                item.amount += amount
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ('amount',))
+        self.filter(id__in=to_delete).delete()
+
+    def upsert_amounts(self, connection, user_ids, amounts):
+        rows = sorted(
+            (user_id, ingredient_id, amount)
+            for user_id in set(user_ids)
+            for ingredient_id, amount in amounts.items()
+        )
+        added = [row for row in rows if row[2] > 0]
+        removed = [row for row in rows if row[2] < 0]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        changes = (
+            'UNNEST(%s::bigint[], %s::bigint[], %s::integer[]) '
+            'AS changes (user_id, ingredient_id, amount)'
+        )
+        with connection.cursor() as cursor:
+            if added:
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                    f'SELECT * FROM {changes} '
+                    'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                    f'SET amount = {table}.amount + EXCLUDED.amount',
+                    [list(column) for column in zip(*added)],
+                )
+            if removed:
+                cursor.execute(
+                    f'UPDATE {table} '
+                    f'SET amount = GREATEST({table}.amount + changes.amount, 0) '
+                    f'FROM {changes} '
+                    f'WHERE {table}.user_id = changes.user_id '
+                    f'AND {table}.ingredient_id = changes.ingredient_id',
+                    [list(column) for column in zip(*removed)],
+                )
+                cursor.execute(
+                    f'DELETE FROM {table} '
+                    'WHERE amount = 0 AND user_id = ANY(%s)',
+                    (list(user_ids),),
+                )
+
+    def add_recipes(self, user_ids, recipe_ids, sign=1):
+        if not recipe_ids:
+            return
+        amounts = (
+            RecipeIngredients.objects.filter(recipe_id__in=recipe_ids)
+            .values('ingredient_id')
+            .annotate(total=models.Sum('amount'))
+            .values_list('ingredient_id', 'total')
+            .order_by()
+        )
+        self.add_amounts(
+            user_ids,
+            {
+                ingredient_id: sign * amount
+                for ingredient_id, amount in amounts
+            },
+        )
+
+    def calculate(self, user_ids=None):
+        lookups = {'recipe__shopping_cart__isnull': False}
+        if user_ids is not None:
+            lookups = {'recipe__shopping_cart__user_id__in': user_ids}
+        totals = (
+            RecipeIngredients.objects.filter(**lookups)
+            .values('recipe__shopping_cart__user', 'ingredient')
+            .annotate(amount=models.Sum('amount'))
+            .order_by()
+        )
+        return {
+            (total['recipe__shopping_cart__user'], total['ingredient']): (
+                total['amount']
+            )
+            for total in totals
+        }
+
+    def rebuild(self, user_ids=None):
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        totals = self.calculate(user_ids)
+        self.bulk_create(
+            self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for (user_id, ingredient_id), amount in totals.items()
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='ингредиент',
+    )
+    amount = models.PositiveIntegerField('общее количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'список покупок'
+        default_related_name = 'shopping_list'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient',
+            ),
+        )
+        ordering = ('-id',)
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок у {self.user}'
@@ -0,0 +1,75 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from recipes.models import Recipe
+
+SEARCH_CONFIG = 'russian'
+
+
+def get_search_vector():
+    return SearchVector(
+        'name',
+        weight='A',
+        config=SEARCH_CONFIG,
+    ) + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+
+
+SEARCH_INDEXES = (
+    GinIndex(get_search_vector(), name='recipe_search_vector_idx'),
+    GinIndex(
+        fields=('name',),
+        opclasses=('gin_trgm_ops',),
+        name='recipe_name_trgm_idx',
+    ),
+)
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        existing = connection.introspection.get_constraints(
+            cursor,
+            Recipe._meta.db_table,
+        )
+    with connection.schema_editor() as schema_editor:
+        for index in SEARCH_INDEXES:
+            if index.name not in existing:
+                schema_editor.add_index(Recipe, index)
+
+
+def search_recipes(queryset, value):
+    if connections[queryset.db].vendor != 'postgresql':
+        matches = Q(name__icontains=value) | Q(text__icontains=value)
+        return (
+            queryset.filter(matches)
+            .annotate(
+                rank=Case(
+                    When(name__iexact=value, then=Value(3)),
+                    When(name__istartswith=value, then=Value(2)),
+                    When(name__icontains=value, then=Value(1)),
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+            )
+            .order_by('-rank', '-id')
+        )
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.annotate(search=get_search_vector())
+        .filter(Q(search=query) | Q(name__trigram_similar=value))
+        .annotate(
+            rank=SearchRank(F('search'), query)
+            + TrigramSimilarity('name', value),
+        )
+        .order_by('-rank', '-id')
+    )
@@ -0,0 +1,150 @@
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import Signal, receiver
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+from users.models import User
+
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+catalog_changed = Signal()
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_recipe_image(sender, instance, **kwargs):
+    from recipes.images import schedule_image_variants
+
+    image_name = instance.image.name
+    if image_name and image_name != instance.image_variants_source:
+        transaction.on_commit(lambda: schedule_image_variants(instance))
+
+
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def touch_recipe_ingredients(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            instance.tags_mask = instance.tags.get_mask()
+            Recipe.objects.filter(pk=instance.pk).touch(
+                tags_mask=instance.tags_mask,
+            )
+    elif action == 'pre_clear':
+        recipes = Recipe.objects.filter(tags=instance)
+        if instance.mask is None:
+            recipes.touch()
+        else:
+            recipes.touch(tags_mask=F('tags_mask').bitand(~instance.mask))
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.filter(pk__in=pk_set).touch(
+            tags_mask=Recipe.objects.get_actual_tags_mask(),
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, **kwargs):
+    if kwargs.get('created'):
+        return
+    recipes = Recipe.objects.filter(tags=instance)
+    if instance.mask is None:
+        recipes.touch()
+    else:
+        recipes.touch(tags_mask=F('tags_mask').bitor(instance.mask))
+
+
+@receiver(post_delete, sender=Tag)
+def remove_tag_mask(sender, instance, **kwargs):
+    if instance.mask is None:
+        return
+    Recipe.objects.with_any_tag(instance.mask).update(
+        tags_mask=F('tags_mask').bitand(~instance.mask),
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields and not AUTHOR_FIELDS.intersection(update_fields):
+        return
+    Recipe.objects.filter(author=instance).touch()
+
+
+@receiver(pre_delete, sender=User)
+def release_user_counters(sender, instance, **kwargs):
+    for model in (Favorite, ShoppingCart):
+        Recipe.objects.filter(
+            pk__in=model.objects.filter(user=instance).values('recipe'),
+        ).change_counter(model.counter_field, -1)
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remove_replaced_cart_recipe(sender, instance, **kwargs):
+    if instance._state.adding:
+        return
+    old = (
+        ShoppingCart.objects.filter(pk=instance.pk)
+        .values_list('user_id', 'recipe_id')
+        .first()
+    )
+    if old is not None:
+        user_id, recipe_id = old
+        ShoppingListItem.objects.add_recipes(
+            (user_id,),
+            (recipe_id,),
+            sign=-1,
+        )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_recipe(sender, instance, **kwargs):
+    ShoppingListItem.objects.add_recipes(
+        (instance.user_id,),
+        (instance.recipe_id,),
+    )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_cart_recipe(sender, instance, **kwargs):
+    ShoppingListItem.objects.add_recipes(
+        (instance.user_id,),
+        (instance.recipe_id,),
+        sign=-1,
+    )
+
+
+def assign_tag_masks(using=DEFAULT_DB_ALIAS, **kwargs):
+    if not router.allow_migrate_model(using, Tag):
+        return
+    with transaction.atomic(using=using):
+        tags = Tag.objects.using(using).assign_missing_masks()
+        if tags:
+            Recipe.objects.using(using).filter(tags__in=tags).update(
+                tags_mask=Recipe.objects.get_actual_tags_mask(),
+            )
@@ -1,11 +1,11 @@
 from django.contrib import admin
 
-from foodgram.admin import BaseAdmin
+from foodgram.admin import AutocompleteFilter, LargeTableAdmin
 from users.models import Follow, User
 
 
 @admin.register(User)
-class UserAdmin(BaseAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = (
         'id',
         'username',
@@ -13,12 +13,16 @@ class UserAdmin(BaseAdmin):
         'first_name',
         'last_name',
     )
-    list_filter = ('email', 'username')
     search_fields = ('email', 'username')
 
 
 @admin.register(Follow)
-class FollowAdmin(BaseAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__email', 'author__email')
+    list_filter = (
+        ('user', AutocompleteFilter),
+        ('author', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'author')
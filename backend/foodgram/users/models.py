@@ -37,6 +37,12 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    def refresh_from_db(self, using=None, fields=None):
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields.intersection(fields):
+            fields = deferred_fields.union(fields)
+        super().refresh_from_db(using, fields)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
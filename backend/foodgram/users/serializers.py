@@ -4,6 +4,14 @@ from rest_framework import serializers
 from users.models import User
 
 
+def get_subscriptions(request):
+    if not hasattr(request, 'subscriptions'):
+        request.subscriptions = set(
+            request.user.follower.values_list('author_id', flat=True),
+        )
+    return request.subscriptions
+
+
 class CreateUserSerializer(UserCreateSerializer):
     class Meta(UserCreateSerializer.Meta):
         model = User
@@ -25,7 +33,7 @@ class CustomUserSerializer(UserSerializer):
         fields = UserSerializer.Meta.fields + ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.following.filter(user=user).exists()
-        return False
+        request = self.context.get('request')
+        if not request.user.is_authenticated:
+            return False
+        return obj.id in get_subscriptions(request)
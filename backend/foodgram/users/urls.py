@@ -1,13 +1,12 @@
 from django.urls import include, path
-from djoser.views import UserViewSet
 from rest_framework.routers import DefaultRouter
 
-from users.views import FollowListView, FollowView
+from users.views import CustomUserViewSet, FollowListView, FollowView
 
 app_name = 'users'
 
 router = DefaultRouter()
-router.register('users', UserViewSet)
+router.register('users', CustomUserViewSet)
 
 
 authurlpatterns = [
@@ -1,11 +1,18 @@
+from django.db.models import Count, OuterRef, Prefetch, Subquery
 from django.shortcuts import get_object_or_404
+from djoser.views import UserViewSet
 from rest_framework import permissions, status
 from rest_framework.response import Response
 
 from api.mixins import CreateDestroyListViewSet, ListViewSet
 from api.pagination import CustomPageNumberPagination
-from api.serializers import FollowSerializer
-from users.models import Follow
+from api.serializers import FollowSerializer, get_recipes_limit
+from recipes.models import Recipe
+from users.models import Follow, User
+
+
+class CustomUserViewSet(UserViewSet):
+    pagination_class = CustomPageNumberPagination
 
 
 class FollowView(CreateDestroyListViewSet):
@@ -15,9 +22,10 @@ class FollowView(CreateDestroyListViewSet):
     pagination_class = None
 
     def post(self, request, pk):
+        author = get_object_or_404(User, pk=pk)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, author_id=pk)
+        serializer.save(user=request.user, author=author)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, pk):
@@ -32,7 +40,28 @@ class FollowListView(ListViewSet):
     queryset = Follow.objects.all()
 
     def get_queryset(self):
-        return self.request.user.follower.all()
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit is not None:
+            recipes = recipes.filter(
+                id__in=Subquery(
+                    Recipe.objects.filter(
+                        author_id=OuterRef('author_id'),
+                    ).values('id')[:recipes_limit],
+                ),
+            )
+        return (
+            self.request.user.follower.select_related('author')
+            .annotate(recipes_count=Count('author__recipes'))
+            .order_by('-id')
+            .prefetch_related(
+                Prefetch(
+                    'author__recipes',
+                    queryset=recipes,
+                    to_attr='recipes_preview',
+                ),
+            )
+        )
 
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)